@@ -0,0 +1,156 @@
+import asyncio
+import json
+import logging
+import time
+from functools import partial
+from groq import APIError
+from generator import client, COMPLETION_PARAMS, _cache_get, _cache_valid, _cache_key, _build_messages, _process_response, generate_component
+from corrector import generate_with_correction
+
+log = logging.getLogger(__name__)
+
+# How long to wait for a Groq batch job before falling back to individual calls
+BATCH_TIMEOUT_SECONDS = 5 * 60
+# How long to keep polling a cancelled job for the results it already finished
+BATCH_CANCEL_GRACE_SECONDS = 60
+BATCH_POLL_SECONDS = 5
+# Cap on prompts generated/corrected concurrently through the regular API
+MAX_CONCURRENT_REQUESTS = 8
+
+_BATCH_FINISHED = {"completed", "failed", "expired", "cancelled"}
+
+async def _run_batch(pending: dict) -> dict:
+    """Submit `{custom_id: messages}` as one Groq batch job and return
+    `{custom_id: raw}` for every request that succeeded.
+
+    If the job does not finish within BATCH_TIMEOUT_SECONDS it is cancelled,
+    and whatever it completed before the cancellation is still returned. Any
+    Batch API failure (e.g. batches not enabled for the key) returns nothing,
+    so the caller falls back to individual calls."""
+    lines = [
+        json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {**COMPLETION_PARAMS, "messages": messages}
+        })
+        for custom_id, messages in pending.items()
+    ]
+    try:
+        input_file = await client.files.create(file=("batch.jsonl", "\n".join(lines).encode()), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+
+        deadline = time.monotonic() + BATCH_TIMEOUT_SECONDS
+        cancelled = False
+        while batch.status not in _BATCH_FINISHED:
+            if time.monotonic() >= deadline:
+                if cancelled:
+                    return {}
+                # Keep polling after cancelling: requests that already finished
+                # are still written to the output file
+                await client.batches.cancel(batch.id)
+                cancelled = True
+                deadline = time.monotonic() + BATCH_CANCEL_GRACE_SECONDS
+            await asyncio.sleep(BATCH_POLL_SECONDS)
+            batch = await client.batches.retrieve(batch.id)
+
+        if not batch.output_file_id:
+            return {}
+
+        output = await client.files.content(batch.output_file_id)
+        text = await output.text()
+    except APIError as e:
+        log.warning("Groq batch job failed, falling back to individual calls: %s", e)
+        return {}
+
+    raws = {}
+    for line in text.splitlines():
+        output = _parse_output_line(line)
+        if output is None:
+            continue
+        custom_id, raw = output
+        if custom_id in pending:
+            raws[custom_id] = raw
+    return raws
+
+def _parse_output_line(line: str):
+    """`(custom_id, raw)` for a successful batch output line, or None.
+
+    Failed, malformed or unexpectedly shaped lines return None, so their
+    prompts fall back to individual calls instead of failing the batch."""
+    if not line.strip():
+        return None
+    try:
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if response.get("status_code") != 200:
+            return None
+        custom_id = item["custom_id"]
+        raw = response["body"]["choices"][0]["message"]["content"]
+    except (ValueError, AttributeError, KeyError, IndexError, TypeError) as e:
+        log.warning("Skipping unreadable Groq batch output line: %r", e)
+        return None
+    if not isinstance(custom_id, str) or not isinstance(raw, str):
+        return None
+    return custom_id, raw
+
+def _precomputed(result: dict):
+    """Wrap an already generated result as a `generator_fn` for the corrector."""
+    async def generator_fn(user_prompt: str, conversation_history: list) -> dict:
+        return result
+    return generator_fn
+
+def _failed(error: BaseException) -> dict:
+    """A generate_with_correction-shaped result for a prompt that raised."""
+    errors = [f"GENERATION_FAILED: {error}"]
+    return {
+        "final_code": {"ts": "", "html": "", "raw": ""},
+        "validation": {"valid": False, "errors": errors, "error_count": len(errors)},
+        "attempts": 0,
+        "success": False
+    }
+
+async def generate_batch_with_correction(requests: list) -> list:
+    """Generate one component per `(user_prompt, conversation_history, use_cache)`.
+
+    Cached requests are served from the response cache and the rest go to Groq
+    in a single batch job. Anything the batch does not return in time is
+    generated individually. Every result then runs through the usual
+    validation and self-correction loop; a prompt that fails is reported as a
+    failed result instead of failing the whole batch."""
+    messages = [_build_messages(prompt, history) for prompt, history, _ in requests]
+    keys = [_cache_key(m) for m in messages]
+
+    async def _cached(key: str, use_cache: bool):
+        return await _cache_get(key) if use_cache else None
+
+    results = list(await asyncio.gather(*(_cached(key, use_cache) for key, (_, _, use_cache) in zip(keys, requests))))
+
+    pending = {str(i): messages[i] for i, result in enumerate(results) if result is None}
+    if pending:
+        for custom_id, raw in (await _run_batch(pending)).items():
+            i = int(custom_id)
+            results[i] = _process_response(raw)
+            if requests[i][2]:
+                await _cache_valid(keys[i], results[i])
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def _generate(prompt: str, history: list, use_cache: bool, result) -> dict:
+        async with semaphore:
+            return await generate_with_correction(
+                prompt,
+                _precomputed(result) if result is not None else partial(generate_component, use_cache=use_cache),
+                history,
+                use_cache
+            )
+
+    outcomes = await asyncio.gather(
+        *(_generate(*request, result) for request, result in zip(requests, results)),
+        return_exceptions=True
+    )
+    return [_failed(o) if isinstance(o, Exception) else o for o in outcomes]
@@ -1,28 +1,54 @@
+import asyncio
 import json
-import os
-import re
-from generator import client, SYSTEM_PROMPT, DESIGN_SYSTEM, _clean_output
+import logging
+from groq import BadRequestError
+from generator import client, COMPLETION_PARAMS, _cache_get, _cache_set, _cache_key, SYSTEM_MESSAGE, _parse_json_output
 from validator import validate_component
+from resources import DESIGN_SYSTEM, CORRECTION_PROMPT
 from dotenv import load_dotenv
 
 load_dotenv()
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+log = logging.getLogger(__name__)
 
 MAX_RETRIES = 2
 
-# Load correction prompt from file
-with open(os.path.join(BASE_DIR, "prompts", "corrector_prompt.txt")) as f:
-    CORRECTION_PROMPT = f.read().strip()
-
-def generate_with_correction(user_prompt: str, generator_fn, conversation_history: list = None) -> dict:
+# Design token categories worth restating for each kind of validation error.
+# Errors not listed here (syntax, filenames) need no tokens at all.
+_TOKENS_FOR_ERROR = {
+    "UNAUTHORIZED_COLOR": ("colors",),
+    "UNAUTHORIZED_RADIUS": ("radii", "button"),
+    "MISSING_FONT": ("fonts",),
+}
+
+def _relevant_tokens(errors: list) -> str:
+    """JSON dump of only the design token categories the errors refer to."""
+    tokens = DESIGN_SYSTEM["tokens"]
+    subset = {}
+    for error in errors:
+        for category in _TOKENS_FOR_ERROR.get(error.split(":", 1)[0], ()):
+            subset[category] = tokens[category]
+    return json.dumps(subset, indent=2)
+
+def _parse_correction(raw: str, fallback_html: str):
+    """Build the corrected result, or None if the response is not usable JSON."""
+    parsed = _parse_json_output(raw)
+    if parsed is None:
+        return None
+    ts_code, html_code = parsed
+    # Keep the previous template if the correction only touched the TypeScript
+    return {"ts": ts_code, "html": html_code or fallback_html, "raw": raw}
+
+async def generate_with_correction(user_prompt: str, generator_fn, conversation_history: list = None, use_cache: bool = True) -> dict:
     # Fix mutable default argument
     if conversation_history is None:
         conversation_history = []
 
     # Pass conversation_history to generator so multi-turn context is preserved
-    result = generator_fn(user_prompt, conversation_history)
-    validation = validate_component(result)
+    result = await generator_fn(user_prompt, conversation_history)
+    # Validation is pure CPU work; run it off the event loop so other in-flight
+    # requests keep progressing while it runs.
+    validation = await asyncio.to_thread(validate_component, result)
 
     attempts = [{"attempt": 1, "code": result, "validation": validation}]
 
@@ -30,47 +56,39 @@ def generate_with_correction(user_prompt: str, generator_fn, conversation_histor
         if validation["valid"]:
             break
 
-        print(f"Attempt {attempt + 1} failed. Errors: {validation['errors']}")
-        print("Auto-correcting...")
+        log.info("Attempt %d failed, auto-correcting. Errors: %s", attempt + 1, validation["errors"])
 
         # Self-correction call
         correction_message = CORRECTION_PROMPT.format(
             errors="\n".join(f"- {e}" for e in validation["errors"]),
             original_code=result["raw"],
-            design_system=json.dumps(DESIGN_SYSTEM["tokens"], indent=2)
-        )
-
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            max_tokens=4096,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": correction_message}
-            ]
+            design_system=_relevant_tokens(validation["errors"])
         )
 
-        raw = response.choices[0].message.content
-        cleaned = _clean_output(raw)
-        normalised = re.sub(r'---\s*HTML\s*---', '---HTML---', cleaned)
-
-        if "---HTML---" in normalised:
-            ts_part, html_part = normalised.split("---HTML---", 1)
-        else:
-            ts_part, html_part = normalised, result["html"]
-
-        # SMARTER EXTRACTION: Ignore any chat text before the code
-        ts_match = re.search(r'(import|@Component|export|import\s+\{)', ts_part, re.IGNORECASE)
-        ts_code = ts_part[ts_match.start():] if ts_match else ts_part
-
-        html_match = re.search(r'<', html_part)
-        html_code = html_part[html_match.start():] if html_match else html_part
-
-        # Remove any trailing "---" or "```" if found
-        ts_code = re.sub(r'\s*([-]{3,}|[`]{3,})\s*$', '', ts_code.strip())
-        html_code = re.sub(r'\s*([-]{3,}|[`]{3,})\s*$', '', html_code.strip())
-
-        result = {"ts": ts_code.strip(), "html": html_code.strip(), "raw": raw}
-        validation = validate_component(result)
+        messages = [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": correction_message}
+        ]
+        cache_key = _cache_key(messages)
+        corrected = await _cache_get(cache_key) if use_cache else None
+        fresh = corrected is None
+        if fresh:
+            try:
+                response = await client.chat.completions.create(**COMPLETION_PARAMS, messages=messages)
+            except BadRequestError as e:
+                # e.g. json_validate_failed: keep the best result we already have
+                log.warning("Correction attempt %d rejected by Groq: %s", attempt + 1, e)
+                break
+            corrected = _parse_correction(response.choices[0].message.content, result["html"])
+            if corrected is None:
+                log.warning("Correction attempt %d returned malformed JSON", attempt + 1)
+                break
+
+        result = corrected
+        validation = await asyncio.to_thread(validate_component, result)
+        # Like generate_component, only keep corrections that actually validate
+        if fresh and use_cache and validation["valid"]:
+            await _cache_set(cache_key, result)
         attempts.append({"attempt": attempt + 2, "code": result, "validation": validation})
 
     return {
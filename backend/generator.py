@@ -1,151 +1,217 @@
+import asyncio
+import hashlib
 import json
+import logging
 import os
 import re as _re
-from groq import Groq
+import diskcache
+from groq import AsyncGroq, BadRequestError, DefaultAioHttpClient
 from dotenv import load_dotenv
+from resources import DESIGN_SYSTEM, SYSTEM_PROMPT, DESIGN_TOKENS_JSON
+from validator import validate_component
 
 load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+log = logging.getLogger(__name__)
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=DefaultAioHttpClient())
 
-with open(os.path.join(BASE_DIR, "design_system.json")) as f:
-    DESIGN_SYSTEM = json.load(f)
+MODEL = "llama-3.3-70b-versatile"
 
-# Load system prompt from file
-with open(os.path.join(BASE_DIR, "prompts", "generate_prompt.txt")) as f:
-    SYSTEM_PROMPT = f.read().strip()
+# Parameters for every completion request (single, correction and batch), so
+# the request shapes cannot drift apart
+COMPLETION_PARAMS = {
+    "model": MODEL,
+    "max_tokens": 4096,
+    "response_format": {"type": "json_object"}
+}
+
+# On-disk LRU cache of post-processed LLM results, keyed by everything sent to
+# the model, so repeated identical requests skip the network round trip.
+# Only results that pass validation are stored (see _cache_valid).
+response_cache = diskcache.Cache(
+    os.getenv("LLM_CACHE_DIR", "/tmp/pythrust-llm-cache"),
+    size_limit=2**30,
+    eviction_policy="least-recently-used"
+)
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60))
+# Part of every cache key. Bump it whenever _process_response or the corrector
+# change what they produce from the same raw output, so stale entries are dropped.
+CACHE_VERSION = 1
+
+ALLOWED_COLORS_STR = str(DESIGN_SYSTEM['rules']['allowed_colors'])
+
+# The design system is identical for every request, so it lives once in the
+# system message alongside SYSTEM_PROMPT instead of being repeated in every user
+# prompt. The prefix is byte-for-byte stable across calls, which only pays off
+# on models with provider-side prompt caching; MODEL is not currently one of them.
+SYSTEM_MESSAGE = f"""{SYSTEM_PROMPT}
+
+DESIGN SYSTEM (you must strictly follow these tokens):
+{DESIGN_TOKENS_JSON}
+
+ALLOWED COLORS ONLY: {ALLOWED_COLORS_STR}
+REQUIRED FONT: {DESIGN_SYSTEM['rules']['required_font']}"""
+
+_PROMPT_PREFIX = "USER REQUEST: "
+_PROMPT_SUFFIX = "\n\nGenerate a complete Angular standalone component now."
 
 def build_generation_prompt(user_prompt: str) -> str:
-    return f"""DESIGN SYSTEM (you must strictly follow these tokens):
-{json.dumps(DESIGN_SYSTEM['tokens'], indent=2)}
+    return _PROMPT_PREFIX + user_prompt + _PROMPT_SUFFIX
+
+# Post-processing patterns, compiled once at import rather than on every call
+_RE_TEMPLATE = _re.compile(r"""template\s*:\s*(['\"`])([\s\S]*?)\1""", _re.MULTILINE)
+_RE_HAS_TEMPLATE_URL = _re.compile(r"templateUrl\s*:\s*['\"]")
+_RE_COMPONENT_OPEN = _re.compile(r"(@Component\s*\(\s*\{)")
+_RE_NGMODEL = _re.compile(r'\bngModel\b')
+_RE_IMPORTS_ARRAY = _re.compile(r'imports\s*:\s*\[([^\]]*)\]')
+_RE_TEMPLATE_URL = _re.compile(r"templateUrl\s*:\s*['\"][^'\"]+['\"]")
+
+_COMMON_MODULE_IMPORT = "import { CommonModule } from '@angular/common';"
+_FORMS_MODULE_IMPORT = "import { FormsModule } from '@angular/forms';"
+
+def _add_forms_module(match) -> str:
+    """`_RE_IMPORTS_ARRAY` replacement that appends FormsModule unless it is already listed."""
+    inner = match.group(1)
+    if 'FormsModule' in inner:
+        return match.group(0)
+    new_inner = inner.strip()
+    if new_inner == '':
+        new = 'FormsModule'
+    else:
+        new = new_inner.rstrip() + ', FormsModule'
+    return f"imports: [{new}]"
 
-ALLOWED COLORS ONLY: {DESIGN_SYSTEM['rules']['allowed_colors']}
-REQUIRED FONT: {DESIGN_SYSTEM['rules']['required_font']}
+def _cache_key(messages: list) -> str:
+    """SHA-256 of the cache version, the request parameters and the exact messages sent."""
+    payload = json.dumps([CACHE_VERSION, COMPLETION_PARAMS, messages], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
 
-USER REQUEST: {user_prompt}
+# diskcache does blocking SQLite and file I/O, so keep it off the event loop
+async def _cache_get(key: str):
+    return await asyncio.to_thread(response_cache.get, key)
 
-Generate a complete Angular standalone component now."""
+async def _cache_set(key: str, value: dict) -> None:
+    await asyncio.to_thread(response_cache.set, key, value, expire=CACHE_TTL_SECONDS)
 
-def _clean_output(text: str) -> str:
-    """Strip markdown code fences by filtering out lines that start with ```."""
-    lines = text.split('\n')
-    cleaned_lines = [line for line in lines if not line.strip().startswith('```')]
-    return '\n'.join(cleaned_lines).strip()
+async def _cache_valid(key: str, result: dict) -> None:
+    """Cache `result` only if it passes validation. An empty or broken result
+    would otherwise be replayed on every regenerate, and so would the
+    correction calls built from it."""
+    validation = await asyncio.to_thread(validate_component, result)
+    if validation["valid"]:
+        await _cache_set(key, result)
 
-def generate_component(user_prompt: str, conversation_history: list = None) -> dict:
-    if conversation_history is None:
-        conversation_history = []
+def _parse_json_output(raw: str):
+    """Pull the TypeScript and HTML out of a JSON-mode `{"ts", "html"}` response.
 
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
+    Returns None when the payload is not a JSON object with string values."""
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    ts_code, html_code = data.get("ts", ""), data.get("html", "")
+    if not isinstance(ts_code, str) or not isinstance(html_code, str):
+        return None
+    return ts_code.strip(), html_code.strip()
+
+def _failed_generation(error: BadRequestError) -> str:
+    """The partial output Groq attaches to a JSON-mode 400, or "" if there is none."""
+    body = error.body if isinstance(error.body, dict) else {}
+    details = body.get("error")
+    failed = details.get("failed_generation") if isinstance(details, dict) else None
+    return failed if isinstance(failed, str) else ""
+
+def _build_messages(user_prompt: str, conversation_history: list) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
         *conversation_history,
         {"role": "user", "content": build_generation_prompt(user_prompt)}
     ]
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        max_tokens=4096,
-        messages=messages
-    )
-
-    raw = response.choices[0].message.content
-    cleaned = _clean_output(raw)
-
-    # Strip backend autocorrect / log lines that may have been injected into the LLM output
-    # Examples: "Attempt 1 failed...", "Auto-correcting...", any INFO: lines, or
-    # explanatory parenthetical notes like "(no HTML is needed here...)" which confuse splitting.
-    cleaned = _re.sub(r"(?m)^\s*(Attempt\s+\d+\s+failed.*|Auto-correcting\.*|INFO:.*)\s*$", "", cleaned)
-    cleaned = _re.sub(r"(?i)\(no\s+html.*?\)", "", cleaned)
-    
-    # Robust splitting: check for case-insensitive separator with varied dashes/spacing
-    sep_pattern = _re.compile(r'-{3,}\s*HTML\s*-{3,}', _re.IGNORECASE)
-    parts = sep_pattern.split(cleaned, 1)
-    
-    if len(parts) == 2:
-        ts_part, html_part = parts
-    else:
-        # Fallback: if separator is missing, try to split at the first HTML tag
-        html_split = _re.search(r'<(div|section|button|nav|header|footer|a\b)', cleaned, _re.IGNORECASE)
-        if html_split:
-            ts_part = cleaned[:html_split.start()]
-            html_part = cleaned[html_split.start():]
-        else:
-            ts_part, html_part = cleaned, ""
 
-    # SMARTER EXTRACTION: Ignore any chat text before the code
-    ts_match = _re.search(r'(import|@Component|export|import\s+\{)', ts_part, _re.IGNORECASE)
-    ts_code = ts_part[ts_match.start():] if ts_match else ts_part
+async def generate_component(user_prompt: str, conversation_history: list = None, use_cache: bool = True) -> dict:
+    if conversation_history is None:
+        conversation_history = []
 
-    html_match = _re.search(r'<', html_part)
-    html_code = html_part[html_match.start():] if html_match else html_part
+    messages = _build_messages(user_prompt, conversation_history)
+    cache_key = _cache_key(messages)
+    if use_cache:
+        cached = await _cache_get(cache_key)
+        if cached is not None:
+            return cached
 
-    # Remove any trailing "---" or "```" if found
-    ts_code = _re.sub(r'\s*([-]{3,}|[`]{3,})\s*$', '', ts_code.strip())
-    html_code = _re.sub(r'\s*([-]{3,}|[`]{3,})\s*$', '', html_code.strip())
+    try:
+        response = await client.chat.completions.create(**COMPLETION_PARAMS, messages=messages)
+    except BadRequestError as e:
+        # JSON mode rejects output that is not valid JSON (json_validate_failed),
+        # including answers cut off at max_tokens. Hand whatever was generated to
+        # the corrector instead of failing the request, and don't cache it.
+        log.warning("Generation rejected by Groq: %s", e)
+        return _process_response(_failed_generation(e))
+
+    result = _process_response(response.choices[0].message.content)
+    if use_cache:
+        await _cache_valid(cache_key, result)
+    return result
+
+def _process_response(raw: str) -> dict:
+    """Turn a raw generation response into the `{ts, html, raw}` result dict."""
+    raw = raw or ""
+    parsed = _parse_json_output(raw)
+    # If the model ignored the JSON format, keep its text as the TypeScript so
+    # validation flags it and the corrector gets a chance to fix it
+    ts_code, html_code = parsed if parsed is not None else (raw.strip(), "")
 
     # If the model inlined the template inside the TypeScript (@Component({ template: `...` }))
     # and we don't have a separate HTML part, extract it into `html_code` so the frontend
-    # can write a dedicated HTML file. Also convert the TS to reference `templateUrl: './app.component.html'`.
-    tpl_match = _re.search(r"""template\s*:\s*(['\"`])([\s\S]*?)\1""", ts_code, _re.MULTILINE)
-    if tpl_match and (not html_code or html_code.strip() == ""):
-        extracted = tpl_match.group(2).strip()
-        # Remove the inlined template property from the TS code
-        ts_code = _re.sub(r",?\s*template\s*:\s*([`\'\"]).*?\1", "", ts_code, count=1, flags=_re.DOTALL)
-
-        # Clean up possible leftover commas and whitespace inside the decorator object
-        ts_code = _re.sub(r",\s*,", ",", ts_code)
-        ts_code = _re.sub(r",\s*(\})", r"\1", ts_code)
-
-        # Insert templateUrl if not already present
-        if not _re.search(r"templateUrl\s*:\s*['\"]", ts_code):
-            ts_code = _re.sub(r"(@Component\s*\(\s*\{)", r"\1\n  templateUrl: './app.component.html',", ts_code, count=1)
-
-        html_code = extracted
+    # can write a dedicated HTML file. The property is swapped in place for
+    # `templateUrl: './app.component.html'`, so the surrounding commas stay valid.
+    tpl_match = _RE_TEMPLATE.search(ts_code)
+    if tpl_match and not html_code:
+        html_code = tpl_match.group(2).strip()
+        before, after = ts_code[:tpl_match.start()], ts_code[tpl_match.end():]
+
+        if _RE_HAS_TEMPLATE_URL.search(before) or _RE_HAS_TEMPLATE_URL.search(after):
+            # A templateUrl already exists; drop the property and one neighbouring comma
+            stripped = before.rstrip()
+            if stripped.endswith(","):
+                before = stripped[:-1]
+            elif after.lstrip().startswith(","):
+                after = after.lstrip()[1:]
+            ts_code = before + after
+        else:
+            ts_code = before + "templateUrl: './app.component.html'" + after
 
-    # Log raw response for debugging (visible in backend logs)
-    try:
-        print("LLM raw response:", raw)
-    except Exception:
-        pass
+    # Log raw response for debugging (visible in backend logs at DEBUG level)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("LLM raw response: %s", raw)
 
     # If the generated code uses ngModel, ensure FormsModule is imported and
     # included in the component `imports` so two-way binding compiles correctly.
-    uses_ngmodel = bool(_re.search(r'\bngModel\b', ts_code)) or bool(_re.search(r'\bngModel\b', html_code)) or bool(_re.search(r'\bngModel\b', raw))
-
-    if uses_ngmodel:
+    # Scan the decoded code, not raw: in the JSON text an ngModel that follows an
+    # escaped newline ("\nngModel") has no word boundary in front of it.
+    if _RE_NGMODEL.search(html_code) or _RE_NGMODEL.search(ts_code):
         # Add import for FormsModule if missing (try to place after CommonModule import)
         if "@angular/forms" not in ts_code:
-            if "import { CommonModule } from '@angular/common';" in ts_code:
-                ts_code = ts_code.replace("import { CommonModule } from '@angular/common';",
-                                          "import { CommonModule } from '@angular/common';\nimport { FormsModule } from '@angular/forms';")
+            idx = ts_code.find(_COMMON_MODULE_IMPORT)
+            if idx >= 0:
+                idx += len(_COMMON_MODULE_IMPORT)
+                ts_code = ts_code[:idx] + "\n" + _FORMS_MODULE_IMPORT + ts_code[idx:]
             else:
-                ts_code = "import { FormsModule } from '@angular/forms';\n" + ts_code
-
-        # Helper: add FormsModule into existing imports: [ ... ] if present
-        def _add_to_imports(match):
-            inner = match.group(1)
-            if 'FormsModule' in inner:
-                return match.group(0)
-            new_inner = inner.strip()
-            if new_inner == '':
-                new = 'FormsModule'
-            else:
-                new = new_inner.rstrip() + ', FormsModule'
-            return f"imports: [{new}]"
+                ts_code = _FORMS_MODULE_IMPORT + "\n" + ts_code
 
-        if _re.search(r'imports\s*:\s*\[[^\]]*\]', ts_code):
-            ts_code = _re.sub(r'imports\s*:\s*\[([^\]]*)\]', _add_to_imports, ts_code, count=1)
-        else:
+        # Add FormsModule into the existing imports: [ ... ] in a single pass
+        ts_code, added = _RE_IMPORTS_ARRAY.subn(_add_forms_module, ts_code, count=1)
+        if not added:
             # If no imports array in @Component, insert one after the opening object
-            ts_code = _re.sub(r'(@Component\s*\(\s*\{)', r"\1\n  imports: [CommonModule, FormsModule],", ts_code, count=1)
-
-        pass
+            ts_code = _RE_COMPONENT_OPEN.sub(r"\1\n  imports: [CommonModule, FormsModule],", ts_code, count=1)
 
     # Normalize any templateUrl the model may have emitted to the single file
     # name used by the frontend StackBlitz embed (`app.component.html`). This
     # prevents mismatches like `templateUrl: './login-page.component.html'`
     # while the frontend writes `app.component.html`.
-    ts_code = _re.sub(r"templateUrl\s*:\s*['\"][^'\"]+['\"]", "templateUrl: './app.component.html'", ts_code)
+    ts_code = _RE_TEMPLATE_URL.sub("templateUrl: './app.component.html'", ts_code)
 
     return {"ts": ts_code.strip(), "html": html_code.strip(), "raw": raw}
\ No newline at end of file
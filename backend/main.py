@@ -1,33 +1,64 @@
+from contextlib import asynccontextmanager
+from functools import partial
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from generator import generate_component
+from generator import client, generate_component
+from resources import DESIGN_SYSTEM
 from corrector import generate_with_correction
-import json
-import os
+from batch import generate_batch_with_correction
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release the aiohttp session behind the shared AsyncGroq client
+    await client.close()
 
-app = FastAPI()
+# ORJSONResponse is current in the pinned fastapi==0.129.0; newer releases
+# deprecate it in favour of serializing through declared response models
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 class GenerateRequest(BaseModel):
     prompt: str
     conversation_history: list = []  # For multi-turn
+    debug: bool = False  # Include the raw LLM response in the reply
+    use_cache: bool = True  # False forces a fresh answer from the model
 
-@app.post("/generate")
-async def generate(req: GenerateRequest):
-    result = generate_with_correction(req.prompt, generate_component, req.conversation_history)
-    return {
+def _to_response(result: dict, debug: bool) -> dict:
+    response = {
         "ts_code": result["final_code"]["ts"],
         "html_code": result["final_code"]["html"],
-        "raw": result["final_code"]["raw"],
         "valid": result["validation"]["valid"],
         "errors": result["validation"]["errors"],
         "attempts_made": result["attempts"]
     }
+    # raw repeats both ts_code and html_code, so only send it when asked for
+    if debug:
+        response["raw"] = result["final_code"]["raw"]
+    return response
+
+@app.post("/generate")
+async def generate(req: GenerateRequest):
+    result = await generate_with_correction(
+        req.prompt,
+        partial(generate_component, use_cache=req.use_cache),
+        req.conversation_history,
+        req.use_cache
+    )
+    return _to_response(result, req.debug)
+
+@app.post("/generate/batch")
+async def generate_batch(reqs: list[GenerateRequest]):
+    # For bulk, non-interactive callers (e.g. evaluation runs): one Groq batch
+    # job instead of a round trip per prompt
+    results = await generate_batch_with_correction(
+        [(req.prompt, req.conversation_history, req.use_cache) for req in reqs]
+    )
+    return [_to_response(result, req.debug) for req, result in zip(reqs, results)]
 
 @app.get("/design-system")
 async def get_design_system():
-    with open(os.path.join(BASE_DIR, "design_system.json")) as f:
-        return json.load(f)
\ No newline at end of file
+    # Served from the copy resources.py already loaded at import
+    return DESIGN_SYSTEM
\ No newline at end of file
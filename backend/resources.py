@@ -0,0 +1,21 @@
+import os
+import orjson
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Static resources shared by the generator, corrector and validator, read and
+# parsed once at import.
+with open(os.path.join(BASE_DIR, "design_system.json"), "rb") as f:
+    DESIGN_SYSTEM = orjson.loads(f.read())
+
+# Load system prompt from file
+with open(os.path.join(BASE_DIR, "prompts", "generate_prompt.txt")) as f:
+    SYSTEM_PROMPT = f.read().strip()
+
+# Load correction prompt from file
+with open(os.path.join(BASE_DIR, "prompts", "corrector_prompt.txt")) as f:
+    CORRECTION_PROMPT = f.read().strip()
+
+# DESIGN_SYSTEM never changes after load, so serialise it once instead of on
+# every request.
+DESIGN_TOKENS_JSON = orjson.dumps(DESIGN_SYSTEM["tokens"], option=orjson.OPT_INDENT_2).decode()
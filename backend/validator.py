@@ -1,26 +1,55 @@
 import re
-import json
-import os
+from resources import DESIGN_SYSTEM
 from dotenv import load_dotenv
 
 load_dotenv()   
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_RE_HEX = re.compile(r'#[0-9a-fA-F]{3,6}')
 
-with open(os.path.join(BASE_DIR, "design_system.json")) as f:
-    DESIGN_SYSTEM = json.load(f)
+# The design system rules never change after load, so build the lookup sets
+# once. The lists are kept for the error messages.
+_RULES = DESIGN_SYSTEM.get("rules", {})
+_ALLOWED_COLORS_LIST = [c.lower() for c in _RULES["allowed_colors"]]
+_ALLOWED_COLORS = frozenset(_ALLOWED_COLORS_LIST)
+_ALLOWED_RADII_LIST = _RULES.get("border_radius_values") or _RULES.get("allowed_radii") or _RULES.get("allowed_radii_values") or []
+_ALLOWED_RADII = frozenset(_ALLOWED_RADII_LIST)
+
+# Mapping of common Tailwind rounded tokens to pixel values
+_TAILWIND_RADII = {
+    "rounded-sm": "4px",
+    "rounded": "8px",
+    "rounded-md": "12px",
+    "rounded-lg": "16px",
+    "rounded-full": "9999px",
+    "rounded-pill": "9999px"
+}
+
+# Every radius form we recognise, fused into one alternation so the code is
+# scanned once:
+#   css - explicit CSS values like 'border-radius: 16px'
+#   bk  - tailwind arbitrary values like 'rounded-[12px]'
+#   px  - classes like 'rounded-16px' (non-standard but possible from model)
+#   tw  - tailwind classes like 'rounded-lg' or 'rounded-md'
+_RE_RADIUS = re.compile(
+    r'border-radius\s*:\s*(?P<css>[0-9]+px|50%|9999px)'
+    r'|rounded-\[\s*(?P<bk>[0-9]+px)\s*\]'
+    r'|rounded-(?P<px>[0-9]+px)\b'
+    r'|\b(?P<tw>rounded(?:-sm|-md|-lg|-full|-pill)?)\b',
+    re.IGNORECASE
+)
+
+_BRACKET_PAIRS = (("{", "}"), ("(", ")"), ("[", "]"))
 
 def validate_component(code: dict) -> dict:
     errors = []
     full_code = code["ts"] + "\n" + code["html"]
     
     # 1. Check for unauthorized hex colors
-    found_colors = re.findall(r'#[0-9a-fA-F]{3,6}', full_code)
-    allowed = [c.lower() for c in DESIGN_SYSTEM["rules"]["allowed_colors"]]
+    found_colors = _RE_HEX.findall(full_code)
     
     for color in found_colors:
-        if color.lower() not in allowed:
-            errors.append(f"UNAUTHORIZED_COLOR: '{color}' is not in the design system. Allowed: {allowed}")
+        if color.lower() not in _ALLOWED_COLORS:
+            errors.append(f"UNAUTHORIZED_COLOR: '{color}' is not in the design system. Allowed: {_ALLOWED_COLORS_LIST}")
     
     # 2. Check font usage - Softened to match 'Inter' anywhere in relevant strings
     if "Inter" not in full_code:
@@ -29,49 +58,27 @@ def validate_component(code: dict) -> dict:
     # 3. Check border-radius tokens
     # This checks for common CSS and Tailwind patterns. Be permissive by
     # recognizing Tailwind rounded classes and bracketed radii like `rounded-[12px]`.
-    rules = DESIGN_SYSTEM.get("rules", {})
-    allowed_radii = rules.get("border_radius_values") or rules.get("allowed_radii") or rules.get("allowed_radii_values") or rules.get("allowed_radii_values") or []
-
-    # Helper: mapping of common Tailwind rounded tokens to pixel values
-    tailwind_map = {
-        "rounded-sm": "4px",
-        "rounded": "8px",
-        "rounded-md": "12px",
-        "rounded-lg": "16px",
-        "rounded-full": "9999px",
-        "rounded-pill": "9999px"
-    }
-
     # Detect radius usage in several forms
     detected_radii = []
-
-    # 1) explicit CSS values like 'border-radius: 16px' or inline style="border-radius: 16px"
-    detected_radii += re.findall(r'border-radius\s*:\s*([0-9]+px|50%|9999px)', full_code, flags=re.IGNORECASE)
-
-    # 2) tailwind classes like 'rounded-lg' or 'rounded-md'
-    for token, px in tailwind_map.items():
-        if token in full_code:
-            detected_radii.append(px)
-
-    # 3) tailwind arbitrary values: rounded-[12px]
-    bracketed = re.findall(r'rounded-\[\s*([0-9]+px)\s*\]', full_code)
-    detected_radii += bracketed
-
-    # 4) classes like 'rounded-16px' (non-standard but possible from model)
-    classes_with_px = re.findall(r'rounded-([0-9]+px)', full_code)
-    detected_radii += classes_with_px
+    for m in _RE_RADIUS.finditer(full_code):
+        tw = m.group("tw")
+        if tw is not None:
+            detected_radii.append(_TAILWIND_RADII[tw.lower()])
+        else:
+            detected_radii.append(m.group("css") or m.group("bk") or m.group("px"))
 
     # If a radius appears anywhere, ensure at least one maps to an allowed radius
     if detected_radii:
-        found_allowed = any(r in allowed_radii for r in detected_radii)
+        found_allowed = any(r in _ALLOWED_RADII for r in detected_radii)
         if not found_allowed:
-            errors.append(f"UNAUTHORIZED_RADIUS: Radius used is not in the design system. Allowed: {allowed_radii}")
+            errors.append(f"UNAUTHORIZED_RADIUS: Radius used is not in the design system. Allowed: {_ALLOWED_RADII_LIST}")
 
     # 4. Basic syntax checks on TypeScript
     ts = code["ts"]
     
-    # Check balanced brackets/braces
-    for open_char, close_char in [("{", "}"), ("(", ")"), ("[", "]")]:
+    # Check balanced brackets/braces. str.count is a C-level scan per character,
+    # which measures faster than a single Counter(ts) pass over the whole string.
+    for open_char, close_char in _BRACKET_PAIRS:
         if ts.count(open_char) != ts.count(close_char):
             errors.append(f"SYNTAX_ERROR: Unbalanced '{open_char}' and '{close_char}'")
     
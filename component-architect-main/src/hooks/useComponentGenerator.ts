@@ -142,12 +142,13 @@ export function useComponentGenerator(): UseComponentGeneratorReturn {
 
       // FIX 2: Store the user prompt + the actual generated CODE as assistant
       // turn — not the raw API JSON. This gives the LLM proper context on
-      // what it built so refinements work correctly.
+      // what it built so refinements work correctly. The code is written in
+      // the same {"ts", "html"} JSON shape the backend asks the model for.
       setHistory([
         { role: "user", content: prompt },
         {
           role: "assistant",
-          content: `Here is the Angular component I generated:\n\nTypeScript:\n${data.ts_code}\n\n---HTML---\n${data.html_code}`,
+          content: JSON.stringify({ ts: data.ts_code, html: data.html_code }),
         },
       ]);
 
@@ -194,7 +195,7 @@ export function useComponentGenerator(): UseComponentGeneratorReturn {
         { role: "user", content: refinePrompt },
         {
           role: "assistant",
-          content: `Here is the refined Angular component:\n\nTypeScript:\n${data.ts_code}\n\n---HTML---\n${data.html_code}`,
+          content: JSON.stringify({ ts: data.ts_code, html: data.html_code }),
         },
       ]);
 